@@ -0,0 +1,73 @@
+import argparse
+import glob
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratings_parser import parse_ratings_table, stats_from_cells
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def parse_with_soup(html, features='html.parser'):
+    # The parser the bot used before ratings_parser: a full BeautifulSoup tree walk.
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, features)
+    stats = {}
+    for row in soup.find_all('tr'):
+        cols = row.find_all('td')
+        if cols:
+            category = cols[0].text.strip()
+            stats[category] = {
+                'elo': cols[1].text.strip() if len(cols) > 1 else 'N/A',
+                'gxe': cols[2].text.strip() if len(cols) > 2 else 'N/A',
+                'glicko': cols[3].text.strip() if len(cols) > 3 else 'N/A',
+                'w': cols[4].text.strip() if len(cols) > 4 else 'N/A',
+                'l': cols[5].text.strip() if len(cols) > 5 else 'N/A',
+            }
+    return stats
+
+def parse_with_soup_typed(html, features='html.parser'):
+    return {category: stats_from_cells(cells) for category, cells in parse_with_soup(html, features).items()}
+
+def available_parsers():
+    parsers = {'ratings_parser': parse_ratings_table}
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        print("beautifulsoup4 is not installed, only benchmarking ratings_parser.")
+        return parsers
+    parsers['bs4 html.parser'] = parse_with_soup_typed
+    try:
+        import lxml  # noqa: F401
+        parsers['bs4 lxml'] = lambda html: parse_with_soup_typed(html, 'lxml')
+    except ImportError:
+        pass
+    return parsers
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare ratings_parser with the BeautifulSoup parsing path.")
+    arg_parser.add_argument('--number', type=int, default=200, help="parses per timing run")
+    arg_parser.add_argument('--repeat', type=int, default=5, help="timing runs per fixture, best one is reported")
+    arg_parser.add_argument('fixtures', nargs='*', help="user page HTML files (default: bench/fixtures/*.html)")
+    args = arg_parser.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURES, '*.html')))
+    parsers = available_parsers()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        expected = parse_ratings_table(html)
+        print(f"{os.path.basename(path)} ({len(html)} bytes, {len(expected)} formats)")
+        baseline = None
+        for name, parse in parsers.items():
+            if parse(html) != expected:
+                print(f"  {name}: results differ from ratings_parser")
+            best = min(timeit.repeat(lambda: parse(html), number=args.number, repeat=args.repeat))
+            per_page = best / args.number * 1e6
+            baseline = baseline or per_page
+            print(f"  {name:<16} {per_page:10.1f} us/page  {per_page / baseline:6.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import hashlib
+import random
+
+from aiohttp import web
+
+FORMATS = ['gen9randombattle', 'gen9ou', 'gen9ubers', 'gen9uu', 'gen9ru', 'gen9nu', 'gen9pu', 'gen9lc',
+           'gen9monotype', 'gen9doublesou', 'gen9nationaldex', 'gen9anythinggoes', 'gen8randombattle', 'gen8ou',
+           'gen7randombattle', 'gen7ou', 'gen6ou', 'gen5ou', 'gen4ou', 'gen3ou']
+
+class FakeShowdown:
+    # Serves synthetic /users/<name> pages shaped like pokemonshowdown.com's. Each request moves
+    # the player's ratings with probability `churn`, and unchanged pages are answered with a 304
+    # when the client sends back the ETag. Responses are delayed by `latency` +/- `jitter` seconds
+    # and fail with a 503 with probability `error_rate`.
+    def __init__(self, formats=8, churn=0.2, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.formats = FORMATS[:formats]
+        self.churn = churn
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.players = {}
+        self.requests = 0
+
+    def ratings(self, player_id):
+        if player_id not in self.players:
+            rng = random.Random(player_id)
+            count = rng.randint(1, len(self.formats))
+            self.players[player_id] = {
+                'version': 0,
+                'ratings': {fmt: {'elo': rng.randint(1000, 1900), 'gxe': round(rng.uniform(30, 90), 1),
+                                  'glicko': rng.randint(1300, 2000), 'glicko_dev': rng.randint(25, 130),
+                                  'w': rng.randint(0, 500), 'l': rng.randint(0, 500)}
+                            for fmt in rng.sample(self.formats, count)},
+            }
+        return self.players[player_id]
+
+    def play(self, state):
+        stats = state['ratings'][self.random.choice(list(state['ratings']))]
+        won = self.random.random() < 0.5
+        stats['elo'] = max(1000, stats['elo'] + self.random.randint(10, 30) * (1 if won else -1))
+        stats['glicko'] += self.random.randint(5, 25) * (1 if won else -1)
+        stats['gxe'] = round(min(99.9, max(0.1, stats['gxe'] + (0.3 if won else -0.3))), 1)
+        stats['w' if won else 'l'] += 1
+        state['version'] += 1
+
+    async def handle_user(self, request):
+        self.requests += 1
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.random.random() < self.error_rate:
+            return web.Response(status=503, text="Service Unavailable")
+        player_id = ''.join(c for c in request.match_info['name'].lower() if c.isalnum())
+        state = self.ratings(player_id)
+        if self.random.random() < self.churn:
+            self.play(state)
+        etag = '"' + hashlib.md5(f"{player_id}:{state['version']}".encode()).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=render_user_page(player_id, state['ratings']), content_type='text/html',
+                            headers={'ETag': etag})
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/users/{name}', self.handle_user)
+        return app
+
+def render_user_page(name, ratings):
+    rows = ''.join(
+        f'<tr><td>{fmt}</td><td style="text-align:center"><strong>{stats["elo"]}</strong></td>'
+        f'<td style="text-align:center">{stats["gxe"]}<small>%</small></td>'
+        f'<td style="text-align:center"><em>{stats["glicko"]}<small> &#177; {stats["glicko_dev"]}</small></em></td>'
+        f'<td style="text-align:center">{stats["w"]}</td><td style="text-align:center">{stats["l"]}</td></tr>\n'
+        for fmt, stats in ratings.items())
+    return f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8" /><title>{name} - Pok&eacute;mon Showdown!</title></head><body>
+<div class="main"><h1>{name}</h1>
+<h3>Ratings</h3>
+<table>
+<tr><th>Format</th><th><abbr title="Elo rating">Elo</abbr></th><th><abbr title="GLIXARE">GXE</abbr></th><th><abbr title="Glicko-1 rating: rating&#177;deviation">Glicko-1</abbr></th><th>W</th><th>L</th></tr>
+{rows}</table>
+</div></body></html>
+'''
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic Pokemon Showdown user pages.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--formats', type=int, default=8, help="number of formats a player can have")
+    parser.add_argument('--churn', type=float, default=0.2, help="chance that a request changes the ratings")
+    parser.add_argument('--latency', type=float, default=0.0, help="response delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random +/- spread of the delay in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="chance that a request fails with a 503")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    server = FakeShowdown(formats=args.formats, churn=args.churn, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, seed=args.seed)
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import aiohttp
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from metrics import BUCKETS, metrics
+
+def serve(port, options):
+    from aiohttp import web
+    from fake_showdown import FakeShowdown
+    web.run_app(FakeShowdown(**options).make_app(), host='127.0.0.1', port=port, print=None)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def wait_for_server(url):
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(f'{url}/users/ping'):
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"Fake Showdown server at {url} did not start")
+
+def print_histograms():
+    for stage, histogram in sorted(metrics.timers.items()):
+        print(f"\n{stage} latency (n={histogram.count}, mean={histogram.total / histogram.count * 1000:.2f}ms)")
+        widest = max(histogram.counts)
+        for bound, count in zip(BUCKETS, histogram.counts):
+            if count:
+                label = 'inf' if bound == float('inf') else f"{bound * 1000:g}ms"
+                print(f"  <= {label:>8} {'#' * max(1, round(count / widest * 40)):<40} {count}")
+
+async def run(args, url):
+    # The bot reads its config and keeps its data relative to the working directory.
+    os.chdir(tempfile.mkdtemp(prefix='showdown-bench-'))
+    import showdown
+    from stats_store import StatsStore
+    from tracker import RateLimiter
+
+    client = showdown.create_client()
+    tracker = client.tracker
+    tracker.showdown_url = url
+    tracker.rate_limiter = RateLimiter(args.requests_per_second)
+    tracker.max_concurrent_requests = args.concurrency
+    tracker.update_interval = client.update_interval = args.interval
+    await tracker.start()
+    client.store = StatsStore(client.stats_db)
+    players = [f'benchplayer{i}' for i in range(args.players)]
+    client.tracked_players.update(dict.fromkeys(players, True))
+    await wait_for_server(url)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if args.mode == 'loop':
+        try:
+            await asyncio.wait_for(tracker.run(), args.rounds * args.interval)
+        except asyncio.TimeoutError:
+            pass
+        await client.flush_stats()
+    else:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        poll = client.fetch_all_stats if args.mode == 'fetch' else client.update_player_stats
+
+        async def poll_one(player):
+            async with semaphore:
+                await poll(player)
+
+        for _ in range(args.rounds):
+            await asyncio.gather(*(poll_one(player) for player in players))
+            await client.flush_stats()
+    elapsed = time.perf_counter() - start
+
+    print(f"\nmode={args.mode} players={args.players} rounds={args.rounds} concurrency={args.concurrency}")
+    print(f"elapsed: {elapsed:.2f}s")
+    print(f"throughput: {metrics.counters['requests'] / elapsed:.1f} requests/s")
+    for line in metrics.summary_lines():
+        print(line)
+    print_histograms()
+    print(f"\npeak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    if args.tracemalloc:
+        print(f"peak Python heap: {tracemalloc.get_traced_memory()[1] / 1024 / 1024:.1f} MiB")
+    await tracker.close()
+    client.store.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the bot's polling path against a fake Showdown server.")
+    parser.add_argument('--mode', choices=['fetch', 'update', 'loop'], default='update',
+                        help="fetch: fetch_all_stats only; update: update_player_stats with storage; "
+                             "loop: the tracking loop with its scheduler")
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=3, help="polls per player (sweeps in loop mode)")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests-per-second', type=float, default=1000.0)
+    parser.add_argument('--interval', type=float, default=10.0, help="update interval in loop mode")
+    parser.add_argument('--latency', type=float, default=0.02, help="server response delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--churn', type=float, default=0.2, help="chance that a poll sees changed ratings")
+    parser.add_argument('--formats', type=int, default=8)
+    parser.add_argument('--tracemalloc', action='store_true', help="also report peak Python heap (slower)")
+    args = parser.parse_args()
+
+    port = free_port()
+    options = {'formats': args.formats, 'churn': args.churn, 'latency': args.latency, 'jitter': args.jitter,
+               'error_rate': args.error_rate}
+    # The server gets its own process so it doesn't compete with the bot for the event loop.
+    server = multiprocessing.get_context('spawn').Process(target=serve, args=(port, options), daemon=True)
+    server.start()
+    try:
+        asyncio.run(run(args, f'http://127.0.0.1:{port}'))
+    finally:
+        server.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from load_test import free_port, serve, wait_for_server
+from tracker import WorkerPool
+
+async def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.1)
+    return True
+
+async def run(args, url):
+    # Kills a tracker worker and checks that its replacement polls its shard at the current
+    # update interval and still receives /track commands.
+    polls = {}
+    sweeps = {}
+
+    async def handle_stats(player, stats):
+        polls[player] = polls.get(player, 0) + 1
+
+    async def handle_sweep(player_count, duration, max_lag, worker_id=None):
+        sweeps.setdefault(worker_id, []).append(duration)
+
+    settings = {'showdown_url': url, 'update_interval': 4, 'requests_per_second': 200}
+    pool = WorkerPool(2, settings, handle_stats, handle_sweep, check_interval=1)
+    pool.start([f'player{i}' for i in range(args.players)])
+    runner = asyncio.create_task(pool.run())
+    failures = []
+    try:
+        if not await wait_for(lambda: len(sweeps) == 2, 20):
+            failures.append("workers did not complete a sweep")
+        pool.set_update_interval(args.interval)
+        # Let the workers apply it and block on their command queues again, which is where
+        # a crash leaves the queue's reader lock held.
+        await asyncio.sleep(1)
+
+        dead = pool.processes[0]
+        os.kill(dead.pid, signal.SIGKILL)
+        sweeps.clear()
+        if not await wait_for(lambda: pool.processes[0] is not dead and 0 in sweeps, 20):
+            failures.append("worker 0 was not restarted")
+        elif max(sweeps[0]) > args.interval * 1.5:
+            failures.append(f"restarted worker swept in {max(sweeps[0]):.1f}s, "
+                            f"not at the {args.interval}s update interval")
+
+        new_players = {}
+        i = 0
+        while len(new_players) < 2:
+            player = f'newplayer{i}'
+            new_players.setdefault(pool.worker_for(player), player)
+            i += 1
+        for player in new_players.values():
+            pool.track(player)
+        for worker_id, player in sorted(new_players.items()):
+            if not await wait_for(lambda: polls.get(player), args.interval * 4):
+                failures.append(f"{player} tracked on worker {worker_id} was never polled")
+    finally:
+        runner.cancel()
+        start = time.monotonic()
+        await pool.close()
+        if time.monotonic() - start > 4:
+            failures.append(f"closing the pool took {time.monotonic() - start:.1f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: the restarted worker picked up the update interval and new players")
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a killed tracker worker is replaced by a working one.")
+    parser.add_argument('--players', type=int, default=60)
+    parser.add_argument('--interval', type=float, default=1.0, help="update interval set before the kill")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.get_context('spawn').Process(target=serve, args=(port, {'latency': 0.01}), daemon=True)
+    server.start()
+    try:
+        url = f'http://127.0.0.1:{port}'
+        asyncio.run(wait_for_server(url))
+        ok = asyncio.run(run(args, url))
+    finally:
+        server.terminate()
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import io
+from datetime import datetime, timezone
+
+SERIES = [('elo', 'Elo'), ('gxe', 'GXE (%)'), ('glicko', 'Glicko-1')]
+
+def lttb(points, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, from each bucket in
+    # between, the point forming the largest triangle with the previous pick and the next bucket's mean.
+    if threshold < 3 or len(points) <= threshold:
+        return list(points)
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    previous = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, len(points))
+        next_bucket = points[end:next_end]
+        avg_x = sum(x for x, _ in next_bucket) / len(next_bucket)
+        avg_y = sum(y for _, y in next_bucket) / len(next_bucket)
+        prev_x, prev_y = points[previous]
+        previous = max(range(start, end), key=lambda j: abs(
+            (prev_x - avg_x) * (points[j][1] - prev_y) - (prev_x - points[j][0]) * (avg_y - prev_y)))
+        sampled.append(points[previous])
+    sampled.append(points[-1])
+    return sampled
+
+def downsample_history(history, max_points):
+    series = {}
+    for field, _ in SERIES:
+        points = [(ts, stats[field]) for ts, stats in history if stats[field] is not None]
+        series[field] = lttb(points, max_points)
+    return series
+
+def render_history(title, history, max_points):
+    # Runs in a worker process, so downsampling happens off the event loop and matplotlib
+    # is only imported there.
+    series = downsample_history(history, max_points)
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(len(SERIES), 1, sharex=True, figsize=(10, 7))
+    try:
+        for ax, (field, label) in zip(axes, SERIES):
+            points = series.get(field) or []
+            times = [datetime.fromtimestamp(ts, timezone.utc) for ts, _ in points]
+            ax.plot(times, [value for _, value in points], drawstyle='steps-post', marker='.', markersize=3)
+            ax.set_ylabel(label)
+            ax.grid(True, alpha=0.3)
+        axes[0].set_title(title)
+        axes[-1].set_xlabel('Time (UTC)')
+        fig.autofmt_xdate()
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=100)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
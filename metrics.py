@@ -0,0 +1,103 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0, float('inf')]
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        # Interpolates linearly inside the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS, self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+class Metrics:
+    # Stage timers and counters for the hot path. Tracker worker processes have their own
+    # instance and send it to the bot process with each sweep, where it is merged in.
+    def __init__(self):
+        self.started = time.time()
+        self.counters = defaultdict(int)
+        self.timers = defaultdict(Histogram)
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def observe(self, stage, seconds):
+        self.timers[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def take(self):
+        # Returns what was recorded since the last call and starts over.
+        taken = Metrics()
+        taken.counters, self.counters = self.counters, defaultdict(int)
+        taken.timers, self.timers = self.timers, defaultdict(Histogram)
+        return taken
+
+    def merge(self, other):
+        for name, value in other.counters.items():
+            self.counters[name] += value
+        for stage, histogram in other.timers.items():
+            self.timers[stage].merge(histogram)
+
+    def summary_lines(self):
+        lines = [f"{name}: {value}" for name, value in sorted(self.counters.items())]
+        for stage, histogram in sorted(self.timers.items()):
+            lines.append(f"{stage}: n={histogram.count} p50={histogram.quantile(0.5) * 1000:.2f}ms "
+                         f"p95={histogram.quantile(0.95) * 1000:.2f}ms p99={histogram.quantile(0.99) * 1000:.2f}ms "
+                         f"max={histogram.max * 1000:.2f}ms")
+        return lines
+
+    def render_prometheus(self):
+        lines = [f"showdown_bot_uptime_seconds {time.time() - self.started:.0f}"]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"showdown_bot_{name}_total {value}")
+        for stage, histogram in sorted(self.timers.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f'showdown_bot_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'showdown_bot_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+            lines.append(f'showdown_bot_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
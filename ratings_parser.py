@@ -0,0 +1,80 @@
+import html
+import re
+
+# Only the ratings table on a user page matters, so instead of building a full DOM we
+# slice out the <table> markup and pull rows and cells out with a few compiled regexes.
+ROW_RE = re.compile(r'<tr\b', re.I)
+CELL_RE = re.compile(r'<(td|th)\b[^>]*>(.*?)(?=<t[dh]\b|</tr\s*>|</table\s*>|$)', re.I | re.S)
+TAG_RE = re.compile(r'<[^>]*>')
+NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+HEADER_FIELDS = {
+    'elo': 'elo',
+    'gxe': 'gxe',
+    'glicko-1': 'glicko',
+    'glicko': 'glicko',
+    'w': 'w',
+    'l': 'l',
+}
+POSITIONAL_FIELDS = ['elo', 'gxe', 'glicko', 'w', 'l']
+
+def cell_text(cell):
+    return ' '.join(html.unescape(TAG_RE.sub('', cell)).split())
+
+def parse_number(text):
+    match = NUMBER_RE.search(text) if text else None
+    return float(match.group()) if match else None
+
+def parse_int(text):
+    number = parse_number(text)
+    return None if number is None else int(round(number))
+
+def parse_glicko(text):
+    # "1589 ± 25" -> (1589, 25)
+    numbers = NUMBER_RE.findall(text) if text else []
+    rating = int(round(float(numbers[0]))) if numbers else None
+    deviation = int(round(float(numbers[1]))) if len(numbers) > 1 else None
+    return rating, deviation
+
+def stats_from_cells(cells):
+    glicko, glicko_dev = parse_glicko(cells.get('glicko'))
+    return {
+        'elo': parse_int(cells.get('elo')),
+        'gxe': parse_number(cells.get('gxe')),
+        'glicko': glicko,
+        'glicko_dev': glicko_dev,
+        'w': parse_int(cells.get('w')),
+        'l': parse_int(cells.get('l')),
+    }
+
+def normalize_stats(stats):
+    # Stats saved before values were parsed are the raw cell strings.
+    if any(isinstance(value, str) for value in stats.values()):
+        return stats_from_cells({key: str(value) for key, value in stats.items() if value is not None})
+    return stats
+
+def parse_ratings_table(page):
+    start = page.find('<table')
+    end = page.rfind('</table')
+    if start == -1:
+        return {}
+    table = page[start:end if end > start else len(page)]
+
+    fields = POSITIONAL_FIELDS
+    stats = {}
+    for row in ROW_RE.split(table)[1:]:
+        cells = CELL_RE.findall(row)
+        if not cells:
+            continue
+        if all(tag.lower() == 'th' for tag, _ in cells):
+            headers = [HEADER_FIELDS.get(cell_text(content).lower()) for _, content in cells[1:]]
+            if any(headers):
+                fields = headers
+            continue
+        values = [cell_text(content) for tag, content in cells if tag.lower() == 'td']
+        if not values:
+            continue
+        category = values[0]
+        stats[category] = stats_from_cells(
+            {field: value for field, value in zip(fields, values[1:]) if field})
+    return stats
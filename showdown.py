@@ -1,34 +1,114 @@
 import discord
 from discord import app_commands
-import aiohttp
-from bs4 import BeautifulSoup
+from aiohttp import web
 import asyncio
-import csv
-from datetime import datetime
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import io
+import multiprocessing
 import os
 import json
+import time
+from typing import Literal, Optional
+from graphs import render_history
+from metrics import metrics
+from stats_store import StatsStore
+from tracker import Tracker, WorkerPool, to_id
 
 def get_bot_token():
     with open('token.txt', 'r') as file:
         return file.read().strip()
 
+GRAPH_RANGES = {'24h': 24 * 3600, '7d': 7 * 24 * 3600, '30d': 30 * 24 * 3600, 'all': None}
+
 intents = discord.Intents.default()
 intents.message_content = True
 
+class ChannelSender:
+    # Queues messages per channel and paces each channel to Discord's limit of
+    # 5 messages per 5 seconds, instead of relying on 429 responses.
+    def __init__(self, client, messages_per_window=5, window=5.0):
+        self.client = client
+        self.messages_per_window = messages_per_window
+        self.window = window
+        self.queues = {}
+        self.sent_times = {}
+        self.tasks = {}
+
+    def enqueue(self, channel_id, embeds):
+        self.queues.setdefault(channel_id, deque()).append(embeds)
+        task = self.tasks.get(channel_id)
+        if task is None or task.done():
+            self.tasks[channel_id] = asyncio.create_task(self.drain(channel_id))
+
+    async def drain(self, channel_id):
+        queue = self.queues[channel_id]
+        sent_times = self.sent_times.setdefault(channel_id, deque())
+        while queue:
+            now = time.monotonic()
+            while sent_times and now - sent_times[0] >= self.window:
+                sent_times.popleft()
+            if len(sent_times) >= self.messages_per_window:
+                await asyncio.sleep(self.window - (now - sent_times[0]))
+                continue
+            embeds = queue.popleft()
+            try:
+                channel = self.client.get_channel(channel_id) or await self.client.fetch_channel(channel_id)
+                await channel.send(embeds=embeds)
+                metrics.count('notifications_sent')
+            except discord.HTTPException as e:
+                print(f"Error sending notification to channel {channel_id}: {e}")
+            sent_times.append(time.monotonic())
+
 class MyClient(discord.Client):
     def __init__(self, *, intents: discord.Intents):
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
         self.tracked_players = {}
         self.update_interval = 300
+        self.max_concurrent_requests = 8
+        self.requests_per_second = 2.0
+        self.http_pool_size = 100
+        self.http_pool_per_host = 10
+        self.http_keepalive = 60
+        self.stats_cache_ttl = 60
+        self.parse_offload_threshold = 4
+        self.showdown_url = 'https://pokemonshowdown.com'
+        self.tracker_workers = 0
+        self.worker_pool = None
+        self.metrics_port = 0
+        self.metrics_runner = None
         self.last_known_stats = {}
         self.stats_folder = 'player_stats'
+        self.stats_db = os.path.join(self.stats_folder, 'stats.db')
         self.config_file = 'bot_config.json'
+        self.store = None
+        self.db_executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_rows = []
+        self.flush_batch_size = 500
+        self.config_save_delay = 5
+        self.config_dirty = False
+        self.config_save_task = None
+        self.graph_cache = OrderedDict()
+        self.graph_cache_size = 64
+        self.graph_max_points = 500
+        self.graph_executor = None
+        self.leaderboard_size = 20
+        self.subscriptions = {}
+        self.subscribers = {}
+        self.milestones = [1500, 1600, 1700, 1800, 1900, 2000]
+        self.notify_interval = 60
+        self.pending_notifications = {}
+        self.sender = ChannelSender(self)
+        self.last_sweeps = {}
         
         if not os.path.exists(self.stats_folder):
             os.makedirs(self.stats_folder)
 
         self.load_config()
+        self.rebuild_subscribers()
+        self.tracker = Tracker(self.tracked_players, self.process_stats, self.finish_sweep,
+                               **self.tracker_settings())
 
     def load_config(self):
         if os.path.exists(self.config_file):
@@ -36,6 +116,24 @@ class MyClient(discord.Client):
                 config = json.load(f)
                 self.tracked_players = config.get('tracked_players', {})
                 self.update_interval = config.get('update_interval', 300)
+                self.max_concurrent_requests = config.get('max_concurrent_requests', 8)
+                self.requests_per_second = config.get('requests_per_second', 2.0)
+                self.http_pool_size = config.get('http_pool_size', 100)
+                self.http_pool_per_host = config.get('http_pool_per_host', 10)
+                self.http_keepalive = config.get('http_keepalive', 60)
+                self.stats_cache_ttl = config.get('stats_cache_ttl', 60)
+                self.parse_offload_threshold = config.get('parse_offload_threshold', 4)
+                self.showdown_url = config.get('showdown_url', 'https://pokemonshowdown.com')
+                self.tracker_workers = config.get('tracker_workers', 0)
+                self.metrics_port = config.get('metrics_port', 0)
+                self.flush_batch_size = config.get('flush_batch_size', 500)
+                self.config_save_delay = config.get('config_save_delay', 5)
+                self.graph_cache_size = config.get('graph_cache_size', 64)
+                self.graph_max_points = config.get('graph_max_points', 500)
+                self.leaderboard_size = config.get('leaderboard_size', 20)
+                self.subscriptions = config.get('subscriptions', {})
+                self.milestones = config.get('milestones', self.milestones)
+                self.notify_interval = config.get('notify_interval', 60)
         else:
             self.tracked_players = {}
             self.update_interval = 300
@@ -43,56 +141,164 @@ class MyClient(discord.Client):
     def save_config(self):
         config = {
             'tracked_players': self.tracked_players,
-            'update_interval': self.update_interval
+            'update_interval': self.update_interval,
+            'max_concurrent_requests': self.max_concurrent_requests,
+            'requests_per_second': self.requests_per_second,
+            'http_pool_size': self.http_pool_size,
+            'http_pool_per_host': self.http_pool_per_host,
+            'http_keepalive': self.http_keepalive,
+            'stats_cache_ttl': self.stats_cache_ttl,
+            'parse_offload_threshold': self.parse_offload_threshold,
+            'showdown_url': self.showdown_url,
+            'tracker_workers': self.tracker_workers,
+            'metrics_port': self.metrics_port,
+            'flush_batch_size': self.flush_batch_size,
+            'config_save_delay': self.config_save_delay,
+            'graph_cache_size': self.graph_cache_size,
+            'graph_max_points': self.graph_max_points,
+            'leaderboard_size': self.leaderboard_size,
+            'subscriptions': self.subscriptions,
+            'milestones': self.milestones,
+            'notify_interval': self.notify_interval
         }
-        with open(self.config_file, 'w') as f:
+        # Write to a temporary file and rename it over the old one, so a crash mid-write
+        # can't leave a truncated config behind.
+        temp_file = self.config_file + '.tmp'
+        with open(temp_file, 'w') as f:
             json.dump(config, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.config_file)
+        self.config_dirty = False
+
+    def schedule_config_save(self):
+        # Coalesces a burst of /track and /untrack commands into a single write, made
+        # config_save_delay seconds after the last one.
+        self.config_dirty = True
+        if self.config_save_task is not None:
+            self.config_save_task.cancel()
+        self.config_save_task = asyncio.create_task(self.save_config_later())
+
+    async def save_config_later(self):
+        await asyncio.sleep(self.config_save_delay)
+        if self.config_dirty:
+            self.save_config()
+
+    async def start_metrics_server(self):
+        # Prometheus text format on localhost only.
+        async def handle_metrics(request):
+            return web.Response(text=metrics.render_prometheus(), content_type='text/plain')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle_metrics)
+        self.metrics_runner = web.AppRunner(app)
+        await self.metrics_runner.setup()
+        await web.TCPSite(self.metrics_runner, '127.0.0.1', self.metrics_port).start()
+        print(f"Serving metrics on http://127.0.0.1:{self.metrics_port}/metrics")
+
+    def tracker_settings(self):
+        return {
+            'showdown_url': self.showdown_url,
+            'update_interval': self.update_interval,
+            'max_concurrent_requests': self.max_concurrent_requests,
+            'requests_per_second': self.requests_per_second,
+            'http_pool_size': self.http_pool_size,
+            'http_pool_per_host': self.http_pool_per_host,
+            'http_keepalive': self.http_keepalive,
+            'stats_cache_ttl': self.stats_cache_ttl,
+            'parse_offload_threshold': self.parse_offload_threshold
+        }
 
     async def setup_hook(self):
+        await self.tracker.start()
+        self.store = StatsStore(self.stats_db)
+        self.import_last_known_stats_json()
+        if self.metrics_port:
+            await self.start_metrics_server()
         await self.tree.sync()
         self.bg_task = self.loop.create_task(self.track_players())
-        self.load_last_known_stats()
+        self.notify_task = self.loop.create_task(self.deliver_notifications())
 
     async def track_players(self):
         await self.wait_until_ready()
-        while not self.is_closed():
-            for player in self.tracked_players:
-                await self.update_player_stats(player)
-            await asyncio.sleep(self.update_interval)
+        if self.tracker_workers > 0:
+            # Polling and parsing run in worker processes; this process only diffs, stores and notifies.
+            self.worker_pool = WorkerPool(self.tracker_workers, self.tracker_settings(),
+                                          self.process_worker_stats, self.finish_sweep)
+            self.worker_pool.start(self.tracked_players)
+            prune_task = asyncio.create_task(self.prune_stats_cache())
+            try:
+                await self.worker_pool.run()
+            finally:
+                prune_task.cancel()
+        else:
+            await self.tracker.run()
+
+    async def process_worker_stats(self, player, stats):
+        # Keep the workers' results in this process's cache too, so /stats right after a poll reuses it.
+        self.tracker.cache_stats(player, stats)
+        await self.process_stats(player, stats)
+
+    async def prune_stats_cache(self):
+        # In worker mode this process never runs a sweep, which is where the cache is normally pruned.
+        while True:
+            await asyncio.sleep(max(self.stats_cache_ttl, 1))
+            self.tracker.prune_http_cache()
+
+    def set_update_interval(self, seconds):
+        self.update_interval = seconds
+        self.tracker.update_interval = seconds
+        if self.worker_pool:
+            self.worker_pool.set_update_interval(seconds)
+
+    def add_tracked_player(self, player):
+        self.tracked_players[player] = True
+        if self.worker_pool:
+            self.worker_pool.track(player)
+
+    def remove_tracked_player(self, player):
+        del self.tracked_players[player]
+        self.last_known_stats.pop(player, None)
+        if self.worker_pool:
+            self.worker_pool.untrack(player)
+
+    async def finish_sweep(self, player_count, duration, max_lag, worker_id=None):
+        # A failed write (e.g. the database is locked by `stats_store.py export`) must not stop
+        # the tracking loop; the rows stay queued and are retried after the next sweep.
+        try:
+            await self.flush_stats()
+            await asyncio.get_running_loop().run_in_executor(
+                self.db_executor, self.store.refresh_aggregates, time.time())
+        except Exception as e:
+            print(f"Error writing stats to the database: {e}")
+        self.last_sweeps[worker_id] = (player_count, duration, max_lag)
+        name = 'Sweep' if worker_id is None else f"Worker {worker_id} sweep"
+        print(f"{name} of {player_count} players took {duration:.1f}s (max queue lag {max_lag:.1f}s)")
+        if duration > self.update_interval:
+            print(f"Warning: sweep took longer than the {self.update_interval}s update interval. "
+                  f"Raise requests_per_second or the update interval, or track fewer players.")
 
     async def update_player_stats(self, player):
         stats = await self.fetch_all_stats(player)
         if stats:
+            await self.process_stats(player, stats)
+
+    async def process_stats(self, player, stats):
+        await self.load_last_known_stats(player)
+        # Decided before the loop, which fills in last_known_stats as it goes.
+        first_poll = not self.last_known_stats[player]
+        with metrics.time('diff'):
             for category, category_stats in stats.items():
                 if self.has_stats_changed(player, category, category_stats):
-                    self.save_stats_to_csv(player, category, category_stats)
+                    metrics.count('stats_changed')
+                    self.queue_change_events(player, category, category_stats, first_poll)
+                    self.record_stats(player, category, category_stats)
                     self.update_last_known_stats(player, category, category_stats)
+        if len(self.pending_rows) >= self.flush_batch_size:
+            await self.flush_stats()
 
-    async def fetch_all_stats(self, player):
-        url = f'https://pokemonshowdown.com/users/{player}'
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        html = await response.text()
-                        soup = BeautifulSoup(html, 'html.parser')
-                        rows = soup.find_all('tr')
-                        stats = {}
-                        for row in rows:
-                            cols = row.find_all('td')
-                            if cols:
-                                category = cols[0].text.strip()
-                                stats[category] = {
-                                    'elo': cols[1].text.strip() if len(cols) > 1 else 'N/A',
-                                    'gxe': cols[2].text.strip() if len(cols) > 2 else 'N/A',
-                                    'glicko': cols[3].text.strip() if len(cols) > 3 else 'N/A',
-                                    'w': cols[4].text.strip() if len(cols) > 4 else 'N/A',
-                                    'l': cols[5].text.strip() if len(cols) > 5 else 'N/A',
-                                }
-                        return stats
-        except Exception as e:
-            print(f"Error fetching stats for {player}: {e}")
-        return None
+    async def fetch_all_stats(self, player, max_age=0):
+        return await self.tracker.fetch_all_stats(player, max_age)
 
     def has_stats_changed(self, player, category, new_stats):
         if player not in self.last_known_stats:
@@ -107,83 +313,220 @@ class MyClient(discord.Client):
             self.last_known_stats[player] = {}
         self.last_known_stats[player][category] = stats.copy()
 
-    def save_stats_to_csv(self, player, category, stats):
-        filename = os.path.join(self.stats_folder, f"{player}_{category}_stats.csv")
-        file_exists = os.path.isfile(filename)
-        
-        with open(filename, 'a', newline='') as csvfile:
-            fieldnames = ['timestamp', 'elo', 'gxe', 'glicko', 'w', 'l']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            if not file_exists:
-                writer.writeheader()
-            
-            writer.writerow({
-                'timestamp': datetime.now().isoformat(),
-                'elo': stats['elo'],
-                'gxe': stats['gxe'],
-                'glicko': stats['glicko'],
-                'w': stats['w'],
-                'l': stats['l']
-            })
-
-    def load_last_known_stats(self):
+    def record_stats(self, player, category, stats):
+        self.pending_rows.append((player, category, time.time(), stats))
+
+    async def flush_stats(self):
+        # Rows are buffered and written in one transaction per sweep (or per flush_batch_size rows).
+        rows, self.pending_rows = self.pending_rows, []
+        if rows:
+            try:
+                with metrics.time('persist'):
+                    await asyncio.get_running_loop().run_in_executor(self.db_executor, self.store.add_rows, rows)
+            except Exception:
+                # last_known_stats has already moved on, so these rows wouldn't be recorded again.
+                self.pending_rows[:0] = rows
+                raise
+            metrics.count('rows_written', len(rows))
+
+    async def load_last_known_stats(self, player):
+        # Last known stats live in the database and are loaded the first time a player is polled,
+        # so startup doesn't depend on how many players and categories are stored.
+        if player not in self.last_known_stats:
+            self.last_known_stats[player] = await asyncio.get_running_loop().run_in_executor(
+                self.db_executor, self.store.load_latest, player)
+
+    def import_last_known_stats_json(self):
         filename = os.path.join(self.stats_folder, 'last_known_stats.json')
         if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                self.last_known_stats = json.load(f)
+            count = self.store.import_latest_json(filename)
+            os.replace(filename, filename + '.imported')
+            print(f"Imported {count} last known stats entries from {filename}")
+
+    def rebuild_subscribers(self):
+        # Maps each player to the channels subscribed to them. Channel ids are strings in the config.
+        self.subscribers = {}
+        for channel_id, players in self.subscriptions.items():
+            for player in players:
+                self.subscribers.setdefault(player, set()).add(int(channel_id))
+
+    def queue_change_events(self, player, category, new_stats, first_poll=False):
+        channels = self.subscribers.get(player)
+        if not channels:
+            return
+        old_stats = self.last_known_stats.get(player, {}).get(category)
+        lines = []
+        if old_stats is None:
+            # Every category is new on a player's first poll, which isn't worth announcing.
+            if first_poll:
+                return
+            lines.append(f"New format: {format_stat(new_stats['elo'])} Elo")
+        elif old_stats['elo'] is not None and new_stats['elo'] is not None and old_stats['elo'] != new_stats['elo']:
+            old_elo, new_elo = old_stats['elo'], new_stats['elo']
+            lines.append(f"Elo {old_elo} → {new_elo} ({new_elo - old_elo:+d}), "
+                         f"W/L {format_stat(new_stats['w'])}/{format_stat(new_stats['l'])}")
+            for milestone in self.milestones:
+                if old_elo < milestone <= new_elo:
+                    lines.append(f"Reached {milestone} Elo!")
+                elif new_elo < milestone <= old_elo:
+                    lines.append(f"Dropped below {milestone} Elo")
+        if lines:
+            for channel_id in channels:
+                self.pending_notifications.setdefault(channel_id, []).append(
+                    (f"{player} · {category}", "\n".join(lines)))
+
+    async def deliver_notifications(self):
+        # Changes are collected for notify_interval seconds and sent as a few embed batches per channel.
+        await self.wait_until_ready()
+        while not self.is_closed():
+            await asyncio.sleep(self.notify_interval)
+            self.flush_notifications()
+
+    def flush_notifications(self):
+        pending, self.pending_notifications = self.pending_notifications, {}
+        for channel_id, fields in pending.items():
+            for embeds in build_embed_messages("Rating updates", fields):
+                self.sender.enqueue(channel_id, embeds)
+
+    def resolve_player(self, player):
+        # Match a typed name like "CDKW2" to the name the player is tracked (and stored) under.
+        player_id = to_id(player)
+        for tracked in self.tracked_players:
+            if to_id(tracked) == player_id:
+                return tracked
+        return player
+
+    async def render_graph(self, player, category, time_range):
+        # Images are cached by the newest recorded timestamp, so they're reused until new data arrives.
+        loop = asyncio.get_running_loop()
+        if category is None:
+            category = await loop.run_in_executor(self.db_executor, self.store.most_recent_category, player)
+            if category is None:
+                return None, None
+        last_ts = await loop.run_in_executor(self.db_executor, self.store.last_timestamp, player, category)
+        if last_ts is None:
+            return category, None
+        key = (player, category, time_range, last_ts)
+        if key in self.graph_cache:
+            self.graph_cache.move_to_end(key)
+            return category, self.graph_cache[key]
+
+        since = time.time() - GRAPH_RANGES[time_range] if GRAPH_RANGES[time_range] else None
+        history = await loop.run_in_executor(self.db_executor, self.store.history, player, category, since)
+        if not history:
+            return category, None
+        if self.graph_executor is None:
+            self.graph_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        title = f"{player} - {category} ({time_range})"
+        image = await loop.run_in_executor(self.graph_executor, render_history, title, history, self.graph_max_points)
+        self.graph_cache[key] = image
+        if len(self.graph_cache) > self.graph_cache_size:
+            self.graph_cache.popitem(last=False)
+        return category, image
+
+    async def fetch_aggregates(self, category=None, players=None):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.db_executor, self.store.aggregates, time.time(), category, players)
+
+    async def on_ready(self):
+        print(f'We have logged in as {self.user}')
 
     async def close(self):
-        self.save_config()
-        filename = os.path.join(self.stats_folder, 'last_known_stats.json')
-        with open(filename, 'w') as f:
-            json.dump(self.last_known_stats, f)
+        if self.config_save_task:
+            self.config_save_task.cancel()
+        if self.config_dirty:
+            self.save_config()
+        if self.worker_pool:
+            await self.worker_pool.close()
+        await self.tracker.close()
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        if self.store:
+            await self.flush_stats()
+            self.store.close()
+        self.db_executor.shutdown(wait=False)
+        if self.graph_executor:
+            self.graph_executor.shutdown(wait=False)
         await super().close()
 
-client = MyClient(intents=intents)
-
-@client.event
-async def on_ready():
-    print(f'We have logged in as {client.user}')
+# Created by create_client(). The graph and tracker worker processes are spawned, so they re-import
+# this module; building the client only in the main process keeps them from loading the config,
+# starting a Tracker and registering commands they don't use.
+client = None
 
-@client.tree.command()
+@app_commands.command()
 async def stats(interaction: discord.Interaction, player: str):
     """Fetch and display current stats for a player in all categories."""
     await interaction.response.defer()
 
-    stats = await client.fetch_all_stats(player)
+    stats = await client.fetch_all_stats(player, max_age=client.stats_cache_ttl)
     if stats:
         await send_stats_messages(interaction, player, stats)
     else:
         await interaction.followup.send(f"Couldn't fetch stats for {player}. The user might not exist.")
 
-async def send_stats_messages(interaction, player, stats):
-    messages = []
-    current_message = f"Stats for {player}:\n\n"
+def format_stat(value, suffix=''):
+    return 'N/A' if value is None else f"{value}{suffix}"
 
-    for category, category_stats in stats.items():
-        category_text = f"{category}:\n"
-        category_text += f"Elo: {category_stats['elo']}\n"
-        category_text += f"GXE: {category_stats['gxe']}\n"
-        category_text += f"Glicko-1: {category_stats['glicko']}\n"
-        category_text += f"W/L: {category_stats['w']}/{category_stats['l']}\n\n"
-
-        if len(current_message) + len(category_text) > 1900:
-            messages.append(current_message)
-            current_message = category_text
-        else:
-            current_message += category_text
+def format_glicko(stats):
+    if stats.get('glicko_dev') is None:
+        return format_stat(stats['glicko'])
+    return f"{stats['glicko']} ± {stats['glicko_dev']}"
 
-    if current_message:
-        messages.append(current_message)
+def format_delta(current, baseline):
+    if current is None or baseline is None:
+        return 'N/A'
+    return f"{current - baseline:+d}"
 
-    for i, message in enumerate(messages):
-        if i == 0:
-            await interaction.followup.send(message)
-        else:
-            await interaction.followup.send(message)
+def format_aggregate(row):
+    games = (row['w'] or 0) + (row['l'] or 0)
+    win_rate = f"{(row['w'] or 0) / games * 100:.1f}%" if games else 'N/A'
+    return (f"{format_stat(row['elo'])} Elo (24h {format_delta(row['elo'], row['elo_24h'])}, "
+            f"7d {format_delta(row['elo'], row['elo_7d'])}), peak {format_stat(row['peak_elo'])}, "
+            f"{win_rate} win rate over {games} games")
+
+def build_embed_messages(title, fields):
+    # Packs (name, value) fields into as few messages as Discord allows: 25 fields per embed,
+    # 10 embeds and 6000 characters per message. Only the first embed of a message has the title.
+    messages = []
+    embeds = []
+    embed = None
+    size = 0
+    for name, value in fields:
+        name, value = name[:256], value[:1024]
+        field_size = len(name) + len(value)
+        if embed is None or len(embed.fields) >= 25 or size + field_size > 6000:
+            if embed is not None:
+                embeds.append(embed)
+            if len(embeds) >= 10 or size + field_size > 6000:
+                messages.append(embeds)
+                embeds = []
+                size = 0
+            embed = discord.Embed(title=None if embeds else title)
+            size += 0 if embeds else len(title)
+        embed.add_field(name=name, value=value, inline=False)
+        size += field_size
+    if embed is not None:
+        embeds.append(embed)
+    if embeds:
+        messages.append(embeds)
+    return messages
+
+async def send_embed_messages(interaction, title, fields):
+    for embeds in build_embed_messages(title, fields):
+        await interaction.followup.send(embeds=embeds)
 
-@client.tree.command()
+async def send_stats_messages(interaction, player, stats):
+    fields = []
+    for category, category_stats in stats.items():
+        category_text = f"Elo: {format_stat(category_stats['elo'])}\n"
+        category_text += f"GXE: {format_stat(category_stats['gxe'], '%')}\n"
+        category_text += f"Glicko-1: {format_glicko(category_stats)}\n"
+        category_text += f"W/L: {format_stat(category_stats['w'])}/{format_stat(category_stats['l'])}"
+        fields.append((category, category_text))
+    await send_embed_messages(interaction, f"Stats for {player}", fields)
+
+@app_commands.command()
 async def track(interaction: discord.Interaction, player: str):
     """Start tracking a player's stats in all categories."""
     await interaction.response.defer()
@@ -192,28 +535,29 @@ async def track(interaction: discord.Interaction, player: str):
         await interaction.followup.send(f"{player} is already being tracked.")
         return
 
-    stats = await client.fetch_all_stats(player)
+    stats = await client.fetch_all_stats(player, max_age=client.stats_cache_ttl)
     if stats:
-        client.tracked_players[player] = True
-        client.save_config()
+        client.add_tracked_player(player)
+        client.schedule_config_save()
         for category, category_stats in stats.items():
-            client.save_stats_to_csv(player, category, category_stats)
+            client.record_stats(player, category, category_stats)
             client.update_last_known_stats(player, category, category_stats)
+        await client.flush_stats()
         await interaction.followup.send(f"Now tracking {player} in all categories. Initial stats have been recorded.")
     else:
         await interaction.followup.send(f"Couldn't fetch stats for {player}. Please check the player name.")
 
-@client.tree.command()
+@app_commands.command()
 async def untrack(interaction: discord.Interaction, player: str):
     """Stop tracking a player's stats."""
     if player in client.tracked_players:
-        del client.tracked_players[player]
-        client.save_config() 
+        client.remove_tracked_player(player)
+        client.schedule_config_save()
         await interaction.response.send_message(f"Stopped tracking {player}.")
     else:
         await interaction.response.send_message(f"{player} is not currently being tracked.")
 
-@client.tree.command()
+@app_commands.command()
 async def list_tracked(interaction: discord.Interaction):
     """List all currently tracked players."""
     if client.tracked_players:
@@ -222,15 +566,147 @@ async def list_tracked(interaction: discord.Interaction):
     else:
         await interaction.response.send_message("No players are currently being tracked.")
 
-@client.tree.command()
+@app_commands.command()
 async def set_update_interval(interaction: discord.Interaction, minutes: int):
     """Set the update interval for tracking (in minutes)."""
     if minutes < 1:
         await interaction.response.send_message("Update interval must be at least 1 minute.")
         return
     
-    client.update_interval = minutes * 60
-    client.save_config()
+    client.set_update_interval(minutes * 60)
+    client.schedule_config_save()
     await interaction.response.send_message(f"Update interval set to {minutes} minutes.")
 
-client.run(get_bot_token())
+@app_commands.command()
+async def tracking_status(interaction: discord.Interaction):
+    """Show how long the last polling sweep took and how far behind schedule it ran."""
+    capacity = int(client.requests_per_second * client.update_interval)
+    status = (f"Tracked players: {len(client.tracked_players)}\n"
+              f"Rate limit: {client.requests_per_second} requests/s, {client.max_concurrent_requests} concurrent "
+              f"requests (up to {capacity} players per {client.update_interval}s interval)\n")
+    if client.tracker_workers > 0:
+        status += f"Tracker workers: {client.tracker_workers}\n"
+    if not client.last_sweeps:
+        status += "No sweep has completed yet."
+    for worker_id, (player_count, duration, max_lag) in sorted(client.last_sweeps.items(), key=lambda item: str(item[0])):
+        name = "Last sweep" if worker_id is None else f"Worker {worker_id} last sweep"
+        status += f"{name}: {player_count} players in {duration:.1f}s, max queue lag {max_lag:.1f}s\n"
+        if duration > client.update_interval:
+            status += "Warning: the tracked-player count has outgrown the update interval.\n"
+    await interaction.response.send_message(status)
+
+@app_commands.command()
+@app_commands.default_permissions(administrator=True)
+async def bot_stats(interaction: discord.Interaction):
+    """Show the bot's request counters and per-stage latencies."""
+    uptime = time.time() - metrics.started
+    lines = [f"uptime: {uptime / 3600:.1f}h", f"tracked players: {len(client.tracked_players)}"]
+    lines += metrics.summary_lines()
+    await interaction.response.send_message("```\n" + "\n".join(lines)[:1900] + "\n```")
+
+@app_commands.command()
+@app_commands.rename(time_range='range')
+async def graph(interaction: discord.Interaction, player: str, category: Optional[str] = None,
+                time_range: Literal['24h', '7d', '30d', 'all'] = '7d'):
+    """Plot a player's Elo, GXE and Glicko-1 history in a category."""
+    await interaction.response.defer()
+
+    player = client.resolve_player(player)
+    try:
+        category, image = await client.render_graph(player, category, time_range)
+    except ImportError:
+        await interaction.followup.send("Graphs need matplotlib. Install it with `pip install matplotlib`.")
+        return
+    if category is None:
+        await interaction.followup.send(f"No stats have been recorded for {player}.")
+    elif image is None:
+        await interaction.followup.send(f"No stats have been recorded for {player} in {category}.")
+    else:
+        await interaction.followup.send(file=discord.File(io.BytesIO(image), filename=f"{player}_{category}.png"))
+
+@app_commands.command()
+async def leaderboard(interaction: discord.Interaction, category: str):
+    """Rank the tracked players in a category by Elo."""
+    await interaction.response.defer()
+
+    rows = await client.fetch_aggregates(category=category)
+    rows = [row for row in rows if row['player'] in client.tracked_players][:client.leaderboard_size]
+    if not rows:
+        await interaction.followup.send(f"No tracked players have stats recorded in {category}.")
+        return
+    fields = [(f"{i}. {row['player']}", format_aggregate(row)) for i, row in enumerate(rows, 1)]
+    await send_embed_messages(interaction, f"Leaderboard for {category}", fields)
+
+@app_commands.command()
+async def compare(interaction: discord.Interaction, player1: str, player2: str):
+    """Compare two players' ratings in every category they have played."""
+    await interaction.response.defer()
+
+    players = [client.resolve_player(player1), client.resolve_player(player2)]
+    by_category = {}
+    for row in await client.fetch_aggregates(players=players):
+        by_category.setdefault(row['category'], {})[row['player']] = row
+    if not by_category:
+        await interaction.followup.send(f"No stats have been recorded for {players[0]} or {players[1]}.")
+        return
+
+    fields = []
+    # Categories both players have played come first.
+    for category, rows in sorted(by_category.items(), key=lambda item: (len(item[1]) < 2, item[0])):
+        category_text = "\n".join(f"{player}: {format_aggregate(rows[player]) if player in rows else 'no stats'}"
+                                  for player in players)
+        fields.append((category, category_text))
+    await send_embed_messages(interaction, f"{players[0]} vs {players[1]}", fields)
+
+@app_commands.command()
+async def subscribe(interaction: discord.Interaction, player: str):
+    """Post a tracked player's rating changes, new formats and milestones in this channel."""
+    player = client.resolve_player(player)
+    if player not in client.tracked_players:
+        await interaction.response.send_message(f"{player} is not being tracked. Use /track first.")
+        return
+    channel_players = client.subscriptions.setdefault(str(interaction.channel_id), {})
+    if player in channel_players:
+        await interaction.response.send_message(f"This channel is already subscribed to {player}.")
+        return
+    channel_players[player] = True
+    client.rebuild_subscribers()
+    client.schedule_config_save()
+    await interaction.response.send_message(f"Rating changes for {player} will be posted in this channel.")
+
+@app_commands.command()
+async def unsubscribe(interaction: discord.Interaction, player: str):
+    """Stop posting a player's rating changes in this channel."""
+    player = client.resolve_player(player)
+    channel_players = client.subscriptions.get(str(interaction.channel_id), {})
+    if player not in channel_players:
+        await interaction.response.send_message(f"This channel is not subscribed to {player}.")
+        return
+    del channel_players[player]
+    if not channel_players:
+        del client.subscriptions[str(interaction.channel_id)]
+    client.rebuild_subscribers()
+    client.schedule_config_save()
+    await interaction.response.send_message(f"Stopped posting rating changes for {player} in this channel.")
+
+@app_commands.command()
+async def subscriptions(interaction: discord.Interaction):
+    """List the players this channel is subscribed to."""
+    channel_players = client.subscriptions.get(str(interaction.channel_id), {})
+    if channel_players:
+        await interaction.response.send_message("This channel is subscribed to:\n" + "\n".join(channel_players))
+    else:
+        await interaction.response.send_message("This channel is not subscribed to any players.")
+
+COMMANDS = [stats, track, untrack, list_tracked, set_update_interval, tracking_status, bot_stats, graph,
+            leaderboard, compare, subscribe, unsubscribe, subscriptions]
+
+def create_client():
+    global client
+    client = MyClient(intents=intents)
+    for command in COMMANDS:
+        client.tree.add_command(command)
+    return client
+
+if __name__ == '__main__':
+    create_client().run(get_bot_token())
@@ -0,0 +1,288 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from ratings_parser import normalize_stats
+
+FIELDS = ['elo', 'gxe', 'glicko', 'glicko_dev', 'w', 'l']
+CSV_FIELDS = ['elo', 'gxe', 'glicko', 'w', 'l']
+PERIODS = {'24h': 24 * 3600, '7d': 7 * 24 * 3600}
+AGGREGATE_FIELDS = ['player', 'category', 'ts', 'elo', 'gxe', 'glicko', 'w', 'l', 'peak_elo', 'peak_ts',
+                    'elo_24h', 'elo_7d']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratings (
+    player TEXT NOT NULL,
+    category TEXT NOT NULL,
+    ts REAL NOT NULL,
+    elo INTEGER,
+    gxe REAL,
+    glicko INTEGER,
+    glicko_dev INTEGER,
+    w INTEGER,
+    l INTEGER
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ratings_player_category_ts ON ratings (player, category, ts);
+CREATE TABLE IF NOT EXISTS latest (
+    player TEXT NOT NULL,
+    category TEXT NOT NULL,
+    ts REAL NOT NULL,
+    elo INTEGER,
+    gxe REAL,
+    glicko INTEGER,
+    glicko_dev INTEGER,
+    w INTEGER,
+    l INTEGER,
+    PRIMARY KEY (player, category)
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    player TEXT NOT NULL,
+    category TEXT NOT NULL,
+    ts REAL NOT NULL,
+    elo INTEGER,
+    gxe REAL,
+    glicko INTEGER,
+    w INTEGER,
+    l INTEGER,
+    peak_elo INTEGER,
+    peak_ts REAL,
+    elo_24h INTEGER,
+    stale_24h REAL,
+    elo_7d INTEGER,
+    stale_7d REAL,
+    PRIMARY KEY (player, category)
+);
+CREATE INDEX IF NOT EXISTS aggregates_category_elo ON aggregates (category, elo);
+CREATE INDEX IF NOT EXISTS aggregates_stale_24h ON aggregates (stale_24h);
+CREATE INDEX IF NOT EXISTS aggregates_stale_7d ON aggregates (stale_7d);
+"""
+
+# Aggregates hold each series' current stats, peak Elo and, per period, the Elo at the start of
+# the period (elo_<period>). stale_<period> is the timestamp of the row after that baseline row:
+# once it falls out of the window the baseline has moved, so only those rows need refreshing.
+UPSERT_AGGREGATES = """
+INSERT INTO aggregates (player, category, ts, elo, gxe, glicko, w, l, peak_elo, peak_ts, elo_24h, elo_7d)
+VALUES (:player, :category, :ts, :elo, :gxe, :glicko, :w, :l, :elo, :ts, :elo, :elo)
+ON CONFLICT (player, category) DO UPDATE SET
+    ts = MAX(ts, excluded.ts),
+    elo = CASE WHEN excluded.ts >= ts THEN excluded.elo ELSE elo END,
+    gxe = CASE WHEN excluded.ts >= ts THEN excluded.gxe ELSE gxe END,
+    glicko = CASE WHEN excluded.ts >= ts THEN excluded.glicko ELSE glicko END,
+    w = CASE WHEN excluded.ts >= ts THEN excluded.w ELSE w END,
+    l = CASE WHEN excluded.ts >= ts THEN excluded.l ELSE l END,
+    peak_elo = CASE WHEN peak_elo IS NULL OR excluded.elo > peak_elo THEN excluded.elo ELSE peak_elo END,
+    peak_ts = CASE WHEN peak_elo IS NULL OR excluded.elo > peak_elo THEN excluded.ts ELSE peak_ts END,
+    stale_24h = COALESCE(stale_24h, excluded.ts),
+    stale_7d = COALESCE(stale_7d, excluded.ts)
+"""
+
+REFRESH_BASELINE = """
+UPDATE aggregates SET (elo_{period}, stale_{period}) = (
+    SELECT r.elo, (SELECT MIN(n.ts) FROM ratings n
+                   WHERE n.player = r.player AND n.category = r.category AND n.ts > r.ts)
+    FROM ratings r
+    WHERE r.player = aggregates.player AND r.category = aggregates.category AND r.ts <= :cutoff
+    ORDER BY r.ts DESC LIMIT 1)
+WHERE stale_{period} <= :cutoff
+"""
+
+# Same as REFRESH_BASELINE for every row, falling back to the first row of a series that
+# started inside the window.
+REBUILD_BASELINE = """
+UPDATE aggregates SET (elo_{period}, stale_{period}) = (
+    SELECT r.elo, (SELECT MIN(n.ts) FROM ratings n
+                   WHERE n.player = r.player AND n.category = r.category AND n.ts > r.ts)
+    FROM ratings r
+    WHERE r.player = aggregates.player AND r.category = aggregates.category
+    ORDER BY r.ts <= :cutoff DESC, CASE WHEN r.ts <= :cutoff THEN -r.ts ELSE r.ts END LIMIT 1)
+"""
+
+class StatsStore:
+    # Timestamps are stored as UTC unix seconds. Every write method runs in a single
+    # transaction, so the bot can flush a whole sweep of rows at once.
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        # Databases created before aggregates existed get them computed once from the history.
+        if (self.conn.execute('SELECT 1 FROM ratings LIMIT 1').fetchone()
+                and not self.conn.execute('SELECT 1 FROM aggregates LIMIT 1').fetchone()):
+            self.rebuild_aggregates(datetime.now(timezone.utc).timestamp())
+
+    def close(self):
+        self.conn.close()
+
+    def add_rows(self, rows):
+        # The latest table holds the last known stats the bot diffs against. Updating it in the
+        # same transaction as the history means a crash can never leave the two out of step.
+        values = [(player, category, ts, *(stats.get(field) for field in FIELDS))
+                  for player, category, ts, stats in rows]
+        with self.conn:
+            inserted = self.conn.executemany(
+                'INSERT OR IGNORE INTO ratings (player, category, ts, elo, gxe, glicko, glicko_dev, w, l) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', values).rowcount
+            self.upsert_latest(values)
+            self.conn.executemany(UPSERT_AGGREGATES, [
+                dict(stats, player=player, category=category, ts=ts) for player, category, ts, stats in rows])
+        return inserted
+
+    def upsert_latest(self, values):
+        self.conn.executemany(
+            'INSERT INTO latest (player, category, ts, elo, gxe, glicko, glicko_dev, w, l) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (player, category) DO UPDATE SET ts = excluded.ts, elo = excluded.elo, '
+            'gxe = excluded.gxe, glicko = excluded.glicko, glicko_dev = excluded.glicko_dev, '
+            'w = excluded.w, l = excluded.l WHERE excluded.ts >= latest.ts', values)
+
+    def load_latest(self, player):
+        cursor = self.conn.execute(
+            'SELECT category, elo, gxe, glicko, glicko_dev, w, l FROM latest WHERE player = ?', (player,))
+        return {row[0]: dict(zip(FIELDS, row[1:])) for row in cursor}
+
+    def import_latest_json(self, filename):
+        # Older versions kept the last known stats in last_known_stats.json, written only on shutdown.
+        ts = os.path.getmtime(filename)
+        with open(filename, 'r') as f:
+            last_known_stats = json.load(f)
+        values = [(player, category, ts, *(normalize_stats(stats).get(field) for field in FIELDS))
+                  for player, categories in last_known_stats.items()
+                  for category, stats in categories.items()]
+        with self.conn:
+            self.upsert_latest(values)
+        return len(values)
+
+    def history(self, player, category, since=None):
+        # Rows are only written on change, so the row in effect at `since` is included too,
+        # moved up to `since`; otherwise the window would start at its first change.
+        cursor = self.conn.execute(
+            'SELECT ts, elo, gxe, glicko, glicko_dev, w, l FROM ratings '
+            'WHERE player = ? AND category = ? AND ts >= ? ORDER BY ts',
+            (player, category, since or 0))
+        history = [(row[0], dict(zip(FIELDS, row[1:]))) for row in cursor]
+        if since is not None and (not history or history[0][0] > since):
+            row = self.conn.execute(
+                'SELECT ts, elo, gxe, glicko, glicko_dev, w, l FROM ratings '
+                'WHERE player = ? AND category = ? AND ts < ? ORDER BY ts DESC LIMIT 1',
+                (player, category, since)).fetchone()
+            if row:
+                history.insert(0, (since, dict(zip(FIELDS, row[1:]))))
+        return history
+
+    def refresh_aggregates(self, now):
+        with self.conn:
+            for period, seconds in PERIODS.items():
+                self.conn.execute(REFRESH_BASELINE.format(period=period), {'cutoff': now - seconds})
+
+    def rebuild_aggregates(self, now):
+        # Recomputes every aggregate from the raw history. SQLite fills the bare columns of a
+        # MAX() aggregate query from the row holding the maximum, i.e. the newest row.
+        with self.conn:
+            self.conn.execute('DELETE FROM aggregates')
+            self.conn.execute(
+                'INSERT INTO aggregates (player, category, ts, elo, gxe, glicko, w, l) '
+                'SELECT player, category, MAX(ts), elo, gxe, glicko, w, l FROM ratings GROUP BY player, category')
+            self.conn.execute(
+                'UPDATE aggregates SET (peak_elo, peak_ts) = ('
+                'SELECT r.elo, r.ts FROM ratings r WHERE r.player = aggregates.player '
+                'AND r.category = aggregates.category AND r.elo IS NOT NULL ORDER BY r.elo DESC, r.ts LIMIT 1)')
+            for period, seconds in PERIODS.items():
+                self.conn.execute(REBUILD_BASELINE.format(period=period), {'cutoff': now - seconds})
+        return self.conn.execute('SELECT COUNT(*) FROM aggregates').fetchone()[0]
+
+    def aggregates(self, now, category=None, players=None):
+        self.refresh_aggregates(now)
+        query = f"SELECT {', '.join(AGGREGATE_FIELDS)} FROM aggregates"
+        if category is not None:
+            cursor = self.conn.execute(query + ' WHERE category = ? ORDER BY elo DESC', (category,))
+        else:
+            cursor = self.conn.execute(
+                query + f" WHERE player IN ({', '.join('?' * len(players))}) ORDER BY category", players)
+        return [dict(zip(AGGREGATE_FIELDS, row)) for row in cursor]
+
+    def last_timestamp(self, player, category):
+        row = self.conn.execute('SELECT MAX(ts) FROM ratings WHERE player = ? AND category = ?',
+                                (player, category)).fetchone()
+        return row[0]
+
+    def most_recent_category(self, player):
+        row = self.conn.execute('SELECT category FROM latest WHERE player = ? ORDER BY ts DESC LIMIT 1',
+                                (player,)).fetchone()
+        return row[0] if row else None
+
+    def series_keys(self, player=None):
+        if player is None:
+            cursor = self.conn.execute('SELECT DISTINCT player, category FROM ratings ORDER BY player, category')
+        else:
+            cursor = self.conn.execute('SELECT DISTINCT player, category FROM ratings WHERE player = ? '
+                                       'ORDER BY category', (player,))
+        return cursor.fetchall()
+
+    def import_csv(self, folder):
+        # Imports the <player>_<category>_stats.csv files written by older versions of the bot.
+        # Rows already in the database are skipped, so running it twice is harmless.
+        imported = 0
+        for filename in sorted(glob.glob(os.path.join(folder, '*_stats.csv'))):
+            name = os.path.basename(filename)[:-len('_stats.csv')]
+            if '_' not in name:
+                continue
+            player, category = name.rsplit('_', 1)
+            rows = []
+            with open(filename, 'r', newline='') as csvfile:
+                for row in csv.DictReader(csvfile):
+                    # Old timestamps are naive local time.
+                    ts = datetime.fromisoformat(row['timestamp']).astimezone(timezone.utc).timestamp()
+                    stats = normalize_stats({field: row.get(field) or '' for field in CSV_FIELDS})
+                    rows.append((player, category, ts, stats))
+            inserted = self.add_rows(rows)
+            imported += inserted
+            print(f"Imported {inserted} of {len(rows)} rows from {filename}")
+        return imported
+
+    def export_csv(self, folder, player=None):
+        os.makedirs(folder, exist_ok=True)
+        exported = 0
+        for key_player, category in self.series_keys(player):
+            filename = os.path.join(folder, f"{key_player}_{category}_stats.csv")
+            with open(filename, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['timestamp'] + FIELDS)
+                for ts, stats in self.history(key_player, category):
+                    timestamp = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+                    writer.writerow([timestamp] + [stats[field] for field in FIELDS])
+                    exported += 1
+        return exported
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the showdown bot stats database.")
+    parser.add_argument('--db', default=os.path.join('player_stats', 'stats.db'), help="path to the stats database")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="import the old per-player CSV files")
+    import_parser.add_argument('folder', nargs='?', default='player_stats')
+    export_parser = commands.add_parser('export', help="export history as <player>_<category>_stats.csv files")
+    export_parser.add_argument('folder')
+    export_parser.add_argument('--player', help="only export this player")
+    commands.add_parser('rebuild-aggregates', help="recompute leaderboard aggregates from the history")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    store = StatsStore(args.db)
+    try:
+        if args.command == 'import':
+            print(f"Imported {store.import_csv(args.folder)} rows into {args.db}")
+            store.rebuild_aggregates(datetime.now(timezone.utc).timestamp())
+        elif args.command == 'export':
+            print(f"Exported {store.export_csv(args.folder, args.player)} rows to {args.folder}")
+        elif args.command == 'rebuild-aggregates':
+            count = store.rebuild_aggregates(datetime.now(timezone.utc).timestamp())
+            print(f"Rebuilt aggregates for {count} player/category pairs")
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    main()
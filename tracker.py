@@ -0,0 +1,366 @@
+import argparse
+import asyncio
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import multiprocessing
+import queue
+import re
+import time
+
+import aiohttp
+
+from metrics import metrics
+from ratings_parser import parse_ratings_table
+
+def to_id(name):
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + 1 / self.rate
+        await asyncio.sleep(slot - now)
+
+class Tracker:
+    # Fetches and parses user pages and polls a set of players on a schedule. The bot runs one
+    # in-process; in worker mode each tracker process runs its own over a shard of the players.
+    def __init__(self, players, handle_stats, handle_sweep, showdown_url='https://pokemonshowdown.com',
+                 update_interval=300, max_concurrent_requests=8, requests_per_second=2.0, http_pool_size=100,
+                 http_pool_per_host=10, http_keepalive=60, stats_cache_ttl=60, parse_offload_threshold=4):
+        self.players = players
+        self.handle_stats = handle_stats
+        self.handle_sweep = handle_sweep
+        self.showdown_url = showdown_url
+        self.update_interval = update_interval
+        self.max_concurrent_requests = max_concurrent_requests
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.http_pool_size = http_pool_size
+        self.http_pool_per_host = http_pool_per_host
+        self.http_keepalive = http_keepalive
+        self.stats_cache_ttl = stats_cache_ttl
+        self.parse_offload_threshold = parse_offload_threshold
+        self.http_session = None
+        self.stats_cache = {}
+        self.http_validators = {}
+        self.parse_executor = ThreadPoolExecutor(max_workers=2)
+        self.fetches_in_flight = 0
+        self.sweep_max_lag = 0.0
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.http_pool_size, limit_per_host=self.http_pool_per_host,
+                                         keepalive_timeout=self.http_keepalive)
+        self.http_session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+
+    async def close(self):
+        if self.http_session:
+            await self.http_session.close()
+        self.parse_executor.shutdown(wait=False)
+
+    async def run(self):
+        self.poll_queue = asyncio.Queue()
+        workers = [asyncio.create_task(self.poll_worker()) for _ in range(self.max_concurrent_requests)]
+        try:
+            while True:
+                await self.run_sweep()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def run_sweep(self):
+        # Spread the polls evenly across the interval instead of bursting them all at once.
+        players = list(self.players)
+        interval = self.update_interval
+        start = time.monotonic()
+        if players:
+            spacing = interval / len(players)
+            self.sweep_max_lag = 0.0
+            for i, player in enumerate(players):
+                due = start + i * spacing
+                await asyncio.sleep(due - time.monotonic())
+                self.poll_queue.put_nowait((player, due))
+            await self.poll_queue.join()
+            await self.handle_sweep(len(players), time.monotonic() - start, self.sweep_max_lag)
+            self.prune_http_cache()
+        await asyncio.sleep(start + interval - time.monotonic())
+
+    async def poll_worker(self):
+        while True:
+            player, due = await self.poll_queue.get()
+            try:
+                if player in self.players:
+                    stats = await self.fetch_all_stats(player, due=due)
+                    if stats:
+                        await self.handle_stats(player, stats)
+            except Exception as e:
+                print(f"Error updating stats for {player}: {e}")
+            finally:
+                self.poll_queue.task_done()
+
+    async def fetch_all_stats(self, player, max_age=0, due=None):
+        # max_age lets /stats reuse a recent result; background polls always go to the server,
+        # but send the last ETag/Last-Modified so an unchanged profile only costs a 304.
+        # Every request, polled or interactive, waits for the rate limiter.
+        player_id = to_id(player)
+        cached = self.stats_cache.get(player_id)
+        if cached and time.monotonic() - cached[0] <= max_age:
+            metrics.count('cache_hits')
+            return cached[1]
+
+        await self.rate_limiter.acquire()
+        if due is not None:
+            self.sweep_max_lag = max(self.sweep_max_lag, time.monotonic() - due)
+
+        url = f'{self.showdown_url}/users/{player}'
+        headers = {}
+        validators = self.http_validators.get(player_id)
+        if validators:
+            etag, last_modified, _ = validators
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        self.fetches_in_flight += 1
+        metrics.count('requests')
+        try:
+            start = time.perf_counter()
+            async with self.http_session.get(url, headers=headers) as response:
+                if response.status == 304 and validators:
+                    metrics.observe('http', time.perf_counter() - start)
+                    metrics.count('not_modified')
+                    stats = validators[2]
+                elif response.status == 200:
+                    html = await response.text()
+                    metrics.observe('http', time.perf_counter() - start)
+                    stats = await self.parse_stats_html(html)
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+                    if etag or last_modified:
+                        self.http_validators[player_id] = (etag, last_modified, stats)
+                else:
+                    metrics.count('http_errors')
+                    return None
+            self.cache_stats(player, stats)
+            return stats
+        except Exception as e:
+            metrics.count('http_errors')
+            print(f"Error fetching stats for {player}: {e}")
+        finally:
+            self.fetches_in_flight -= 1
+        return None
+
+    async def parse_stats_html(self, html):
+        # A single page parses in well under a millisecond, but during a busy sweep the pages
+        # add up, so move them off the event loop to keep heartbeats and interactions responsive.
+        if self.fetches_in_flight > self.parse_offload_threshold:
+            stats, seconds = await asyncio.get_running_loop().run_in_executor(self.parse_executor, timed_parse, html)
+        else:
+            stats, seconds = timed_parse(html)
+        # Recorded here rather than in the executor thread; metrics are only touched from the event loop.
+        metrics.observe('parse', seconds)
+        return stats
+
+    def cache_stats(self, player, stats):
+        self.stats_cache[to_id(player)] = (time.monotonic(), stats)
+
+    def prune_http_cache(self):
+        now = time.monotonic()
+        tracked = {to_id(player) for player in self.players}
+        self.stats_cache = {key: value for key, value in self.stats_cache.items()
+                            if now - value[0] <= self.stats_cache_ttl}
+        self.http_validators = {key: value for key, value in self.http_validators.items() if key in tracked}
+
+def timed_parse(html):
+    # Times the parse alone, so the 'parse' stage doesn't include waiting for the thread pool.
+    start = time.perf_counter()
+    stats = parse_ratings_table(html)
+    return stats, time.perf_counter() - start
+
+def hash_key(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+class HashRing:
+    # Consistent hashing, so changing the number of workers only moves about 1/n of the players.
+    def __init__(self, nodes, replicas=64):
+        self.ring = sorted((hash_key(f"{node}:{i}"), node) for node in nodes for i in range(replicas))
+        self.keys = [key for key, _ in self.ring]
+
+    def node_for(self, key):
+        index = bisect.bisect(self.keys, hash_key(key)) % len(self.keys)
+        return self.ring[index][1]
+
+def run_worker(worker_id, players, settings, commands, results):
+    asyncio.run(worker_main(worker_id, players, settings, commands, results))
+
+async def worker_main(worker_id, players, settings, commands, results):
+    async def handle_stats(player, stats):
+        results.put(('stats', worker_id, player, stats))
+
+    async def handle_sweep(player_count, duration, max_lag):
+        results.put(('sweep', worker_id, player_count, duration, max_lag))
+        results.put(('metrics', worker_id, metrics.take()))
+
+    tracker = Tracker({player: True for player in players}, handle_stats, handle_sweep, **settings)
+    await tracker.start()
+    sweeps = asyncio.create_task(tracker.run())
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            command = await loop.run_in_executor(None, commands.get)
+            if command is None:
+                break
+            action, value = command
+            if action == 'track':
+                tracker.players[value] = True
+            elif action == 'untrack':
+                tracker.players.pop(value, None)
+            elif action == 'interval':
+                tracker.update_interval = value
+    finally:
+        sweeps.cancel()
+        await tracker.close()
+
+class WorkerPool:
+    # Coordinates tracker worker processes: players are assigned to workers on a hash ring,
+    # /track and /untrack are forwarded to the owning worker, and fetched stats come back
+    # over a multiprocessing queue to handle_stats in this process.
+    def __init__(self, worker_count, settings, handle_stats, handle_sweep, check_interval=5):
+        self.worker_count = worker_count
+        self.check_interval = check_interval
+        # The global request rate is split evenly between the workers.
+        self.settings = dict(settings, requests_per_second=settings.get('requests_per_second', 2.0) / worker_count)
+        self.handle_stats = handle_stats
+        self.handle_sweep = handle_sweep
+        self.context = multiprocessing.get_context('spawn')
+        self.ring = HashRing(range(worker_count))
+        self.results = self.context.Queue()
+        self.commands = [None] * worker_count
+        self.processes = [None] * worker_count
+        self.players = {}
+        self.reader = ThreadPoolExecutor(max_workers=1)
+
+    def worker_for(self, player):
+        return self.ring.node_for(to_id(player))
+
+    def start(self, players):
+        self.players = dict.fromkeys(players, True)
+        for worker_id in range(self.worker_count):
+            self.start_worker(worker_id)
+
+    def start_worker(self, worker_id):
+        # Each process gets a new command queue: a worker killed while blocked in commands.get()
+        # never releases the queue's reader lock, so its replacement couldn't read from the old one.
+        # The shard and settings are rebuilt from the pool, so commands left in the old queue aren't needed.
+        if self.commands[worker_id] is not None:
+            self.commands[worker_id].cancel_join_thread()
+            self.commands[worker_id].close()
+        self.commands[worker_id] = self.context.Queue()
+        shard = [player for player in self.players if self.worker_for(player) == worker_id]
+        process = self.context.Process(target=run_worker, daemon=True, name=f'tracker-{worker_id}',
+                                       args=(worker_id, shard, self.settings, self.commands[worker_id], self.results))
+        process.start()
+        self.processes[worker_id] = process
+        print(f"Started tracker worker {worker_id} with {len(shard)} players")
+
+    def track(self, player):
+        self.players[player] = True
+        self.commands[self.worker_for(player)].put(('track', player))
+
+    def untrack(self, player):
+        self.players.pop(player, None)
+        self.commands[self.worker_for(player)].put(('untrack', player))
+
+    def set_update_interval(self, seconds):
+        self.settings['update_interval'] = seconds
+        for commands in self.commands:
+            commands.put(('interval', seconds))
+
+    def restart_dead_workers(self):
+        for worker_id, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                print(f"Tracker worker {worker_id} exited with code {process.exitcode}, restarting it")
+                self.start_worker(worker_id)
+
+    def next_result(self):
+        try:
+            return self.results.get(timeout=self.check_interval)
+        except queue.Empty:
+            return 'idle'
+
+    async def run(self):
+        # Liveness is checked every check_interval seconds even while results keep arriving,
+        # since the other workers' results would otherwise hide a dead one.
+        loop = asyncio.get_running_loop()
+        last_check = time.monotonic()
+        while True:
+            message = await loop.run_in_executor(self.reader, self.next_result)
+            if message is None:
+                break
+            if time.monotonic() - last_check >= self.check_interval:
+                self.restart_dead_workers()
+                last_check = time.monotonic()
+            if message == 'idle':
+                continue
+            kind, worker_id, *payload = message
+            try:
+                if kind == 'stats':
+                    await self.handle_stats(*payload)
+                elif kind == 'sweep':
+                    await self.handle_sweep(*payload, worker_id=worker_id)
+                elif kind == 'metrics':
+                    metrics.merge(*payload)
+            except Exception as e:
+                print(f"Error handling {kind} from tracker worker {worker_id}: {e}")
+
+    async def close(self):
+        for commands in self.commands:
+            if commands is not None:
+                commands.put(None)
+        self.results.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            if process is not None:
+                await loop.run_in_executor(None, process.join, 5)
+                if process.is_alive():
+                    process.terminate()
+        self.reader.shutdown(wait=False)
+
+async def run_headless(args):
+    async def handle_stats(player, stats):
+        print(f"{player}: {len(stats)} formats")
+
+    async def handle_sweep(player_count, duration, max_lag, worker_id=None):
+        print(f"Worker {worker_id}: sweep of {player_count} players took {duration:.1f}s "
+              f"(max queue lag {max_lag:.1f}s)")
+
+    settings = {'showdown_url': args.showdown_url, 'update_interval': args.interval,
+                'requests_per_second': args.requests_per_second}
+    pool = WorkerPool(args.workers, settings, handle_stats, handle_sweep)
+    pool.start(args.players)
+    try:
+        await asyncio.wait_for(pool.run(), args.duration)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await pool.close()
+
+def main():
+    # Runs the worker pool without Discord, e.g. against bench/fake_showdown.py.
+    parser = argparse.ArgumentParser(description="Poll players with tracker worker processes and print the results.")
+    parser.add_argument('players', nargs='+')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--showdown-url', default='https://pokemonshowdown.com')
+    parser.add_argument('--interval', type=float, default=10)
+    parser.add_argument('--requests-per-second', type=float, default=2.0)
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run before exiting")
+    asyncio.run(run_headless(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()